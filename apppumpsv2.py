@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from fpdf import FPDF
+from fpdf.enums import XPos, YPos
 import math
 import time
+from functools import lru_cache
 
 # --- Dicionário de Fluidos com suas propriedades (Massa Específica e Viscosidade Cinemática) ---
 # Massa Específica (rho) em kg/m³
@@ -14,49 +17,69 @@ FLUIDOS = {
     "Óleo Leve (genérico)": {"rho": 880.0, "nu": 1.5e-5}
 }
 
-# --- Funções de Cálculo de Engenharia ---
+# --- Diâmetros internos comerciais (mm) avaliados no gráfico de custo ---
+# A série já é aproximadamente geométrica (razão ~1,25), concentrando pontos nos diâmetros pequenos,
+# onde o custo varia mais rapidamente.
+DIAMETROS_COMERCIAIS_MM = np.array([25, 32, 40, 50, 65, 80, 100, 125, 150, 200, 250, 300], dtype=float)
 
-def calcular_perda_carga(vazao_m3h, diametro_mm, comprimento_m, rugosidade_mm, k_total, fluido_selecionado):
-    """
-    Calcula a perda de carga e a velocidade do fluido.
-    Retorna um dicionário com os resultados.
-    """
-    if diametro_mm == 0:
-        return {"principal": 0, "localizada": 0, "velocidade": 0}
+# Inverso de 2g (s²/m), usado no cálculo da carga cinética v²/2g
+_INV_2G = 1.0 / (2 * 9.81)
 
-    # Conversões
-    vazao_m3s = vazao_m3h / 3600
-    diametro_m = diametro_mm / 1000
-    rugosidade_m = rugosidade_mm / 1000
-    
-    # Propriedades do fluido
-    nu = FLUIDOS[fluido_selecionado]["nu"]
-    
-    # Cálculos intermediários
-    area = (math.pi * diametro_m**2) / 4
+@lru_cache(maxsize=None)
+def _fluid_props(fluido_selecionado):
+    """Retorna (rho, nu) do fluido selecionado."""
+    props = FLUIDOS[fluido_selecionado]
+    return props["rho"], props["nu"]
+
+# --- Funções de Cálculo de Engenharia ---
+
+def _perda_core(vazao_m3s, diametro_m, comprimento_m, rugosidade_m, k_total, nu):
+    """Núcleo escalar em unidades SI. Retorna (principal, localizada, velocidade)."""
+    area = (math.pi * diametro_m * diametro_m) / 4
     velocidade = vazao_m3s / area
     
     reynolds = (velocidade * diametro_m) / nu if nu > 0 else 0
     
     fator_atrito = 0
     if reynolds > 4000: # Regime turbulento
-        # Fórmula de Swamee-Jain
-        fator_atrito = 0.25 / (math.log10((rugosidade_m / (3.7 * diametro_m)) + (5.74 / reynolds**0.9)))**2
+        # Aproximação explícita de Serghides para Colebrook-White (três logs, sem potência)
+        rug_rel = rugosidade_m / (3.7 * diametro_m)
+        a = -2 * math.log10(rug_rel + 12 / reynolds)
+        b = -2 * math.log10(rug_rel + 2.51 * a / reynolds)
+        c = -2 * math.log10(rug_rel + 2.51 * b / reynolds)
+        x = a - (b - a)**2 / (c - 2 * b + a)
+        fator_atrito = 1 / (x * x)
     elif reynolds > 0: # Regime laminar
         fator_atrito = 64 / reynolds
         
-    perda_carga_principal = fator_atrito * (comprimento_m / diametro_m) * (velocidade**2 / (2 * 9.81))
-    perda_carga_localizada = k_total * (velocidade**2 / (2 * 9.81))
+    v2_over_2g = velocidade * velocidade * _INV_2G
+    perda_carga_principal = fator_atrito * (comprimento_m / diametro_m) * v2_over_2g
+    perda_carga_localizada = k_total * v2_over_2g
+    return perda_carga_principal, perda_carga_localizada, velocidade
+
+@st.cache_data(show_spinner=False)
+def calcular_perda_carga(vazao_m3h, diametro_mm, comprimento_m, rugosidade_mm, k_total, nu):
+    """
+    Calcula a perda de carga e a velocidade do fluido.
+    Retorna um dicionário com os resultados.
+    """
+    if diametro_mm == 0:
+        return {"principal": 0, "localizada": 0, "velocidade": 0}
+
+    # Conversões para SI e cálculo no núcleo escalar
+    principal, localizada, velocidade = _perda_core(
+        vazao_m3h / 3600, diametro_mm / 1000, comprimento_m, rugosidade_mm / 1000, k_total, nu
+    )
     
     return {
-        "principal": perda_carga_principal,
-        "localizada": perda_carga_localizada,
+        "principal": principal,
+        "localizada": localizada,
         "velocidade": velocidade
     }
 
-def calcular_analise_energetica(vazao_m3h, h_man, eficiencia_bomba, eficiencia_motor, horas_dia, custo_kwh, fluido_selecionado):
+@st.cache_data(show_spinner=False)
+def calcular_analise_energetica(vazao_m3h, h_man, eficiencia_bomba, eficiencia_motor, horas_dia, custo_kwh, rho):
     """Realiza todos os cálculos de potência, consumo e custo."""
-    rho = FLUIDOS[fluido_selecionado]["rho"]
     g = 9.81
     vazao_m3s = vazao_m3h / 3600
 
@@ -81,57 +104,83 @@ def calcular_analise_energetica(vazao_m3h, h_man, eficiencia_bomba, eficiencia_m
         "custo_anual": custo_anual
     }
 
-def gerar_grafico_diametro_custo(vazao, h_geometrica, comp_tub, rug_tub, k_total_acessorios, rend_bomba, rend_motor, horas_por_dia, tarifa_energia, fluido_selecionado):
+@st.cache_data(show_spinner=False)
+def gerar_grafico_diametro_custo(vazao, h_geometrica, comp_tub, rug_tub, k_total_acessorios, rend_bomba, rend_motor, horas_por_dia, tarifa_energia, rho, nu):
     """Gera dados para o gráfico de Custo Anual vs. Diâmetro."""
-    diametros_comerciais = [25, 32, 40, 50, 65, 80, 100, 125, 150, 200, 250, 300]
-    custos_anuais = []
+    diametros_mm = DIAMETROS_COMERCIAIS_MM
 
-    for diam in diametros_comerciais:
-        # Passando apenas os argumentos necessários de forma explícita
-        perdas = calcular_perda_carga(vazao, diam, comp_tub, rug_tub, k_total_acessorios, fluido_selecionado)
-        h_man_total_calc = h_geometrica + perdas["principal"] + perdas["localizada"]
-        
-        resultados_calc = calcular_analise_energetica(vazao, h_man_total_calc, rend_bomba, rend_motor, horas_por_dia, tarifa_energia, fluido_selecionado)
-        custos_anuais.append(resultados_calc['custo_anual'])
+    # Mesmas equações de calcular_perda_carga, avaliadas de uma vez sobre todos os diâmetros
+    vazao_m3s = vazao / 3600
+    diametro_m = diametros_mm / 1000
+    rugosidade_m = rug_tub / 1000
+
+    area = np.pi * diametro_m**2 / 4
+    velocidade = vazao_m3s / area
+    reynolds = velocidade * diametro_m / nu if nu > 0 else np.zeros_like(velocidade)
+
+    # Serghides (turbulento) ou 64/Re (laminar); np.errstate evita avisos nos ramos descartados
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rug_rel = rugosidade_m / (3.7 * diametro_m)
+        a = -2 * np.log10(rug_rel + 12 / reynolds)
+        b = -2 * np.log10(rug_rel + 2.51 * a / reynolds)
+        c = -2 * np.log10(rug_rel + 2.51 * b / reynolds)
+        x = a - (b - a)**2 / (c - 2 * b + a)
+        fator_atrito = np.where(reynolds > 4000, 1 / (x * x),
+                                np.where(reynolds > 0, 64 / reynolds, 0.0))
 
-    chart_data = pd.DataFrame({
-        'Diâmetro da Tubulação (mm)': diametros_comerciais,
-        'Custo Anual de Energia (R$)': custos_anuais
-    })
+    v2_over_2g = velocidade * velocidade
+    v2_over_2g *= _INV_2G
+    h_man_total_calc = fator_atrito * (comp_tub / diametro_m) * v2_over_2g
+    h_man_total_calc += k_total_acessorios * v2_over_2g
+    h_man_total_calc += h_geometrica
+
+    # Mesmas equações de calcular_analise_energetica, reduzidas a um fator escalar (R$/ano por metro de altura)
+    if rend_bomba > 0 and rend_motor > 0:
+        fator_custo = vazao_m3s * rho * 9.81 / (rend_bomba * rend_motor * 1000) * horas_por_dia * 30 * 12 * tarifa_energia
+    else:
+        fator_custo = 0.0
+    custos_anuais = h_man_total_calc * fator_custo
+
+    # Diâmetros já como índice, sem a cópia de um set_index posterior
+    chart_data = pd.DataFrame(
+        {'Custo Anual de Energia (R$)': custos_anuais},
+        index=pd.Index(diametros_mm, name='Diâmetro da Tubulação (mm)')
+    )
     return chart_data
 
+# Mensagens de sugestão, na mesma ordem das condições avaliadas em gerar_sugestoes
+_SUGESTOES = (
+    "Eficiência da bomba abaixo de 60%. Considere a substituição por um modelo mais moderno e eficiente.",
+    "Eficiência do motor abaixo de 85%. Motores de alto rendimento (IR3+) podem gerar grande economia.",
+    "Se a vazão for variável, um inversor de frequência pode reduzir drasticamente o consumo de energia.",
+    "Realize manutenções preventivas, verifique vazamentos e o estado dos rotores e selos da bomba.",
+)
+
 def gerar_sugestoes(eficiencia_bomba, eficiencia_motor, custo_anual):
     """Gera uma lista de sugestões de melhoria."""
-    sugestoes = []
-    if eficiencia_bomba < 0.6:
-        sugestoes.append("Eficiência da bomba abaixo de 60%. Considere a substituição por um modelo mais moderno e eficiente.")
-    if eficiencia_motor < 0.85:
-        sugestoes.append("Eficiência do motor abaixo de 85%. Motores de alto rendimento (IR3+) podem gerar grande economia.")
-    if custo_anual > 5000:
-        sugestoes.append("Se a vazão for variável, um inversor de frequência pode reduzir drasticamente o consumo de energia.")
-    sugestoes.append("Realize manutenções preventivas, verifique vazamentos e o estado dos rotores e selos da bomba.")
-    return sugestoes
+    condicoes = (eficiencia_bomba < 0.6, eficiencia_motor < 0.85, custo_anual > 5000, True)
+    return [sugestao for condicao, sugestao in zip(condicoes, _SUGESTOES) if condicao]
 
 class PDF(FPDF):
     def header(self):
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, 'Relatório de Análise Energética de Bombeamento', 0, 1, 'C')
+        self.set_font('Helvetica', 'B', 12)
+        self.cell(0, 10, 'Relatório de Análise Energética de Bombeamento', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.ln(5)
     def footer(self):
         self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+        self.set_font('Helvetica', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', align='C')
     def chapter_title(self, title):
-        self.set_font('Arial', 'B', 11)
-        self.cell(0, 10, title, 0, 1, 'L')
+        self.set_font('Helvetica', 'B', 11)
+        self.cell(0, 10, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.ln(2)
     def chapter_body(self, data):
-        self.set_font('Arial', '', 10)
-        for key, value in data.items():
-            self.cell(80, 7, f"  {key}:", 0, 0)
-            self.cell(0, 7, str(value), 0, 1)
+        self.set_font('Helvetica', '', 10)
+        texto = "\n".join(f"  {key}: {value}" for key, value in data.items())
+        self.multi_cell(0, 7, texto)
         self.ln(5)
 
+@st.cache_data(show_spinner=False)
 def criar_relatorio_pdf(inputs, resultados, sugestoes):
     """Cria o PDF e retorna o conteúdo em bytes."""
     pdf = PDF()
@@ -141,7 +190,7 @@ def criar_relatorio_pdf(inputs, resultados, sugestoes):
     pdf.chapter_title("Resultados da Análise")
     pdf.chapter_body(resultados)
     pdf.chapter_title("Sugestões de Melhoria")
-    pdf.set_font('Arial', '', 10)
+    pdf.set_font('Helvetica', '', 10)
     for sugestao in sugestoes:
         pdf.multi_cell(0, 5, f"- {sugestao}")
         pdf.ln(2)
@@ -188,31 +237,42 @@ with st.sidebar:
 # --- Lógica Principal e Exibição de Resultados ---
 col1, col2 = st.columns([0.6, 0.4])
 
+# Propriedades do fluido, obtidas uma vez por execução e repassadas aos cálculos
+rho, nu = _fluid_props(fluido_selecionado)
+
 with col1:
     st.header("📊 Resultados da Análise")
     velocidade_fluido = 0 
+    metricas = []  # (rótulo, valor, delta)
 
     if tipo_calculo_h == "Calcular a partir da tubulação":
-        perdas_dict = calcular_perda_carga(vazao, diam_tub, comp_tub, rug_tub, k_total_acessorios, fluido_selecionado)
+        perdas_dict = calcular_perda_carga(vazao, diam_tub, comp_tub, rug_tub, k_total_acessorios, nu)
         h_man_total = h_geometrica + perdas_dict["principal"] + perdas_dict["localizada"]
         velocidade_fluido = perdas_dict["velocidade"]
         
-        st.subheader("Parâmetros Hidráulicos Calculados")
-        c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Altura Total", f"{h_man_total:.2f} m", delta="Calculado")
-        c2.metric("Perda Principal", f"{perdas_dict['principal']:.2f} m")
-        c3.metric("Perda Localizada", f"{perdas_dict['localizada']:.2f} m")
-        c4.metric("Velocidade", f"{velocidade_fluido:.2f} m/s")
+        metricas += [
+            ("Altura Total", f"{h_man_total:.2f} m", "Calculado"),
+            ("Perda Principal", f"{perdas_dict['principal']:.2f} m", None),
+            ("Perda Localizada", f"{perdas_dict['localizada']:.2f} m", None),
+            ("Velocidade", f"{velocidade_fluido:.2f} m/s", None),
+        ]
+        st.subheader("Parâmetros Hidráulicos, Potências e Custos")
     else: 
         h_man_total = h_man_manual
+        st.subheader("Potências e Custos")
     
-    resultados = calcular_analise_energetica(vazao, h_man_total, rend_bomba/100, rend_motor/100, horas_por_dia, tarifa_energia, fluido_selecionado)
+    resultados = calcular_analise_energetica(vazao, h_man_total, rend_bomba/100, rend_motor/100, horas_por_dia, tarifa_energia, rho)
 
-    st.subheader("Potências e Custos para o Diâmetro Informado")
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Potência Elétrica", f"{resultados['potencia_eletrica_kW']:.2f} kW")
-    c2.metric("Custo Mensal", f"R$ {resultados['custo_mensal']:.2f}")
-    c3.metric("Custo Anual", f"R$ {resultados['custo_anual']:.2f}")
+    metricas += [
+        ("Potência Elétrica", f"{resultados['potencia_eletrica_kW']:.2f} kW", None),
+        ("Custo Mensal", f"R$ {resultados['custo_mensal']:.2f}", None),
+        ("Custo Anual", f"R$ {resultados['custo_anual']:.2f}", None),
+    ]
+
+    # Um único layout de colunas; as métricas preenchem a grade linha a linha
+    colunas = st.columns(4)
+    for i, (rotulo, valor, delta) in enumerate(metricas):
+        colunas[i % len(colunas)].metric(rotulo, valor, delta=delta)
 
     if tipo_calculo_h == "Calcular a partir da tubulação":
         st.subheader("Gráfico: Custo Anual de Energia vs. Diâmetro da Tubulação")
@@ -229,12 +289,20 @@ with col1:
             "rend_motor": rend_motor / 100,
             "horas_por_dia": horas_por_dia,
             "tarifa_energia": tarifa_energia,
-            "fluido_selecionado": fluido_selecionado
+            "rho": rho,
+            "nu": nu
         }
         
-        # Chama a função desempacotando o dicionário.
-        chart_data = gerar_grafico_diametro_custo(**params_grafico)
-        st.bar_chart(chart_data.set_index('Diâmetro da Tubulação (mm)'))
+        # Reaproveita a curva da execução anterior se nenhum parâmetro mudou;
+        # caso contrário, chama a função desempacotando o dicionário.
+        chave_grafico = tuple(params_grafico.values())
+        if st.session_state.get('chart_key') == chave_grafico:
+            chart_data = st.session_state['chart_data']
+        else:
+            chart_data = gerar_grafico_diametro_custo(**params_grafico)
+            st.session_state['chart_key'] = chave_grafico
+            st.session_state['chart_data'] = chart_data
+        st.bar_chart(chart_data)
 
 with col2:
     st.header("💡 Sugestões e Relatório")
@@ -260,14 +328,19 @@ with col2:
         "Custo Anual": f"R$ {resultados['custo_anual']:.2f}"
     }
     
-    # Gera o PDF em memória
-    pdf_bytes = criar_relatorio_pdf(inputs_relatorio, resultados_relatorio, sugestoes)
-    timestr = time.strftime("%Y%m%d-%H%M%S")
+    # Gera o PDF em memória apenas quando solicitado
+    dados_relatorio = (inputs_relatorio, resultados_relatorio, sugestoes)
+    if st.button("Gerar PDF"):
+        st.session_state['pdf'] = criar_relatorio_pdf(*dados_relatorio)
+        st.session_state['pdf_dados'] = dados_relatorio
+        timestr = time.strftime("%Y%m%d-%H%M%S")
+        st.session_state['pdf_nome'] = f"Relatorio_Bombeamento_{timestr}.pdf"
     
-    # Exibe o botão de download
-    st.download_button(
-        label="Download do Relatório em PDF",
-        data=pdf_bytes,
-        file_name=f"Relatorio_Bombeamento_{timestr}.pdf",
-        mime="application/octet-stream"
-    )
+    # Exibe o botão de download se o PDF gerado corresponde aos dados atuais
+    if 'pdf' in st.session_state and st.session_state.get('pdf_dados') == dados_relatorio:
+        st.download_button(
+            label="Download do Relatório em PDF",
+            data=st.session_state['pdf'],
+            file_name=st.session_state['pdf_nome'],
+            mime="application/octet-stream"
+        )